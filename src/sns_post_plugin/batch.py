@@ -0,0 +1,316 @@
+"""複数アカウントの記事をまとめて取得するバッチ処理モジュール"""
+
+import json
+import logging
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, TextIO
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .zenn_fetcher import ZennDataFetcher
+from .qiita_fetcher import QiitaDataFetcher
+from .hatena_fetcher import HatenaArchiveCrawler
+from .cache_store import CacheStore
+from .history import PostedHistory
+from .session import DEFAULT_USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+# ホストごとの同時接続数の上限（未指定のホストは default_host_limit を使用）
+DEFAULT_HOST_LIMITS = {
+    "zenn.dev": 8,
+    "qiita.com": 4,
+    "b.hatena.ne.jp": 20,
+}
+
+SUPPORTED_PLATFORMS = ("zenn", "qiita", "hatena")
+
+
+class HostLimitedSession(requests.Session):
+    """ホストごとに同時リクエスト数を制限するHTTPセッション"""
+
+    def __init__(self, host_limits: Optional[Dict[str, int]] = None, default_host_limit: int = 8):
+        """
+        HostLimitedSessionの初期化
+
+        Args:
+            host_limits: ホスト名ごとの同時リクエスト数の上限
+            default_host_limit: host_limitsに含まれないホストの上限
+        """
+        super().__init__()
+        self.headers.update({"User-Agent": DEFAULT_USER_AGENT})
+        self.host_limits = dict(DEFAULT_HOST_LIMITS if host_limits is None else host_limits)
+        self.default_host_limit = default_host_limit
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+        # ワーカー数ぶんのコネクションを使い回せるようにプールを広げる
+        pool_size = max([default_host_limit, *self.host_limits.values()])
+        adapter = HTTPAdapter(pool_connections=32, pool_maxsize=pool_size)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def _semaphore_for(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                limit = self.host_limits.get(host, self.default_host_limit)
+                semaphore = threading.BoundedSemaphore(max(1, limit))
+                self._semaphores[host] = semaphore
+            return semaphore
+
+    def request(self, method, url, *args, **kwargs):
+        host = urlparse(url).hostname or ""
+        with self._semaphore_for(host):
+            return super().request(method, url, *args, **kwargs)
+
+
+def load_accounts(path: str) -> List[Dict[str, Any]]:
+    """
+    アカウント一覧をJSONファイルから読み込む
+
+    Args:
+        path: アカウント一覧のJSONファイルのパス（"-" の場合は標準入力）
+
+    Returns:
+        List[Dict[str, Any]]: アカウント設定のリスト
+    """
+    if path == "-":
+        accounts = json.load(sys.stdin)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            accounts = json.load(f)
+
+    if isinstance(accounts, dict):
+        accounts = accounts.get("accounts", [])
+    if not isinstance(accounts, list):
+        raise ValueError("accounts must be a list")
+    return accounts
+
+
+class _HatenaJob:
+    """はてなブログ1件分のクロール状態"""
+
+    def __init__(self, index: int, account: Dict[str, Any], crawler: HatenaArchiveCrawler, archive_count: int):
+        self.index = index
+        self.account = account
+        self.crawler = crawler
+        self.pending = archive_count
+        self.articles: List[Dict[str, Any]] = []
+
+
+class BatchRunner:
+    """複数アカウントの取得処理を1つのワーカープールで実行するクラス"""
+
+    def __init__(
+        self,
+        max_workers: int = 32,
+        host_limits: Optional[Dict[str, int]] = None,
+        default_host_limit: int = 8,
+        output: Optional[TextIO] = None,
+    ):
+        """
+        BatchRunnerの初期化
+
+        Args:
+            max_workers: 共有ワーカープールのスレッド数
+            host_limits: ホスト名ごとの同時リクエスト数の上限
+            default_host_limit: host_limitsに含まれないホストの上限
+            output: 結果をJSON Lines形式で逐次書き出す出力先
+        """
+        self.max_workers = max_workers
+        self.output = output
+        self.session = HostLimitedSession(host_limits=host_limits, default_host_limit=default_host_limit)
+        self.cache_store = CacheStore()
+        self.history = PostedHistory()
+
+    def _emit(self, results: List[Optional[Dict[str, Any]]], index: int, result: Dict[str, Any]):
+        """1アカウント分の結果を記録し、出力先に書き出す"""
+        results[index] = result
+        if self.output is not None:
+            self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            self.output.flush()
+
+    def _fetch_popular(self, account: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """ZennまたはQiitaの人気記事を取得（ワーカースレッドで実行）"""
+        username = account.get("username")
+        if not username:
+            raise ValueError("username is required")
+
+        if account["platform"] == "zenn":
+            fetcher = ZennDataFetcher(
+                username, is_company=account.get("is_company", False), session=self.session, history=self.history
+            )
+        else:
+            fetcher = QiitaDataFetcher(username, session=self.session, history=self.history)
+
+        return fetcher.get_popular_articles(
+            limit=account.get("limit", 1),
+            random_seed=account.get("random_seed"),
+            cooldown_days=account.get("cooldown_days"),
+        )
+
+    def run(self, accounts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        全アカウントの記事を取得する
+
+        ZennとQiitaはアカウント単位、はてなブログはアーカイブページと
+        ブックマーク数の取得をリクエスト単位で共有プールに投入する。
+        結果は完了した順に出力先へ書き出される。
+
+        Args:
+            accounts: アカウント設定のリスト
+                （platform: "zenn" / "qiita" / "hatena" と各ツールの引数）
+
+        Returns:
+            List[Dict[str, Any]]: 入力順に並べたアカウントごとの結果
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(accounts)
+        pending: Dict[Future, Callable[[Future], None]] = {}
+        started_at = datetime.now()
+
+        def fail(index: int, error: Exception):
+            logger.error(f"❌ バッチ取得エラー ({accounts[index]}): {error}")
+            self._emit(results, index, {"account": accounts[index], "error": str(error)})
+
+        logger.info(f"📦 {len(accounts)}件のアカウントをバッチ取得開始（{self.max_workers}スレッド）")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+
+            def submit(fn: Callable, *args, on_done: Callable[[Future], None]):
+                pending[executor.submit(fn, *args)] = on_done
+
+            def on_popular_done(index: int) -> Callable[[Future], None]:
+                def handler(future: Future):
+                    try:
+                        articles = future.result()
+                    except Exception as e:
+                        fail(index, e)
+                        return
+                    self._emit(results, index, {"account": accounts[index], "articles": articles})
+
+                return handler
+
+            def finish_hatena(job: _HatenaJob):
+                try:
+                    job.crawler.save_cache(job.articles)
+                    selected_article = (
+                        job.crawler.weighted_random_selection(job.articles, cooldown_days=job.account.get("cooldown_days"))
+                        if job.articles
+                        else None
+                    )
+                except Exception as e:
+                    fail(job.index, e)
+                    return
+                self._emit(
+                    results, job.index, {"account": job.account, "articles": [selected_article] if selected_article else []}
+                )
+
+            def on_bookmark_done(job: _HatenaJob) -> Callable[[Future], None]:
+                def handler(future: Future):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"❌ ブックマーク取得エラー: {e}")
+                    job.pending -= 1
+                    if job.pending == 0:
+                        finish_hatena(job)
+
+                return handler
+
+            def on_archive_done(job: _HatenaJob) -> Callable[[Future], None]:
+                def handler(future: Future):
+                    try:
+                        job.articles.extend(future.result())
+                    except Exception as e:
+                        logger.error(f"❌ アーカイブ取得エラー: {e}")
+                    job.pending -= 1
+                    if job.pending > 0:
+                        return
+
+                    if not job.articles:
+                        finish_hatena(job)
+                        return
+
+                    try:
+                        job.pending = len(job.articles)
+                        for article in job.articles:
+                            submit(job.crawler._fetch_single_bookmark_count, article, on_done=on_bookmark_done(job))
+                    except Exception as e:
+                        fail(job.index, e)
+
+                return handler
+
+            def start_hatena(index: int, account: Dict[str, Any]):
+                crawler = HatenaArchiveCrawler(
+                    blog_url=account["blog_url"], session=self.session, cache_store=self.cache_store, history=self.history
+                )
+                cached_articles = crawler.load_cache() if account.get("use_cache", True) else None
+                if cached_articles:
+                    selected_article = crawler.weighted_random_selection(
+                        cached_articles, cooldown_days=account.get("cooldown_days")
+                    )
+                    self._emit(results, index, {"account": account, "articles": [selected_article]})
+                    return
+
+                archive_urls = crawler.generate_archive_urls(account.get("start_year", 2014))
+                job = _HatenaJob(index, account, crawler, len(archive_urls))
+                if not archive_urls:
+                    finish_hatena(job)
+                    return
+                for archive_url in archive_urls:
+                    submit(crawler.fetch_articles_from_archive, archive_url, on_done=on_archive_done(job))
+
+            for index, account in enumerate(accounts):
+                platform = account.get("platform")
+                if platform not in SUPPORTED_PLATFORMS:
+                    fail(index, ValueError(f"Unknown platform: {platform}"))
+                    continue
+
+                if platform in ("zenn", "qiita"):
+                    submit(self._fetch_popular, account, on_done=on_popular_done(index))
+                    continue
+
+                blog_url = account.get("blog_url")
+                if not blog_url:
+                    fail(index, ValueError("blog_url is required"))
+                    continue
+
+                try:
+                    start_hatena(index, account)
+                except Exception as e:
+                    fail(index, e)
+
+            # 完了したタスクの後続処理はすべてこのスレッドで行う（共有プール内で待ち合わせない）
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.pop(future)(future)
+
+        elapsed = (datetime.now() - started_at).total_seconds()
+        logger.info(f"🎉 バッチ取得完了: {len(accounts)}件 ({elapsed:.1f}秒)")
+        return [result for result in results if result is not None]
+
+
+def parse_host_limits(values: List[str]) -> Dict[str, int]:
+    """
+    "host=N" 形式の指定をホストごとの上限に変換する
+
+    Args:
+        values: "host=N" 形式の文字列のリスト
+
+    Returns:
+        Dict[str, int]: DEFAULT_HOST_LIMITS を上書きしたホストごとの上限
+    """
+    host_limits = dict(DEFAULT_HOST_LIMITS)
+    for value in values:
+        host, sep, limit = value.partition("=")
+        if not sep or not host:
+            raise ValueError(f"Invalid host limit: {value}")
+        host_limits[host] = int(limit)
+    return host_limits
@@ -0,0 +1,415 @@
+"""記事キャッシュを管理するストアモジュール
+
+キャッシュディレクトリは以下の構成で、ソース（ブログ等）ごとのシャードと
+記事レコードのパックを分けて保存する。記事レコードはURLのハッシュで管理し、
+URLのホストとパスの先頭（例: example.hatenablog.com/entry）ごとに1つのパックに
+まとめる。同じURLの記事は必ず同じパックに入るため、複数のソースから参照されても
+1つのレコードとして共有され、1つのソースの読み込みは通常1つのパックで済む。
+
+    store/
+    ├── index.json              # ソースごとのシャード位置・サイズ・記事数とパックのサイズ
+    ├── store.lock              # 書き込み時のプロセス間ロック
+    ├── shards/<xx>/<hash>.json # ソースごとのメタデータと記事レコードへの参照
+    └── packs/<xx>/<hash>.json  # 記事レコードのパック（レコードIDから記事へのマップ）
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "sns-post-plugin"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# ソースごとに異なる、または更新のたびに変わる記事のフィールド（レコードではなくシャード側に保存する）
+SHARD_FIELDS = ("archive_url", "bookmark_count")
+
+# これより古い一時ファイルは書き込みが中断されたものとしてcompactで削除する
+STALE_TMP_SECONDS = 3600
+
+# fcntlが使えない環境ではプロセス内の排他のみ行う
+_fallback_lock = threading.RLock()
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+def _read_json(path: Path) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path: Path, data: Any) -> int:
+    """一時ファイル経由でJSONを書き込み、書き込んだバイト数を返す"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+    return len(payload)
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """
+    ロックファイルで排他ロックを取得する
+
+    flockはオープンしたファイルごとのロックのため、同じプロセスの別スレッドとも排他になる。
+
+    Args:
+        path: ロックファイルのパス
+    """
+    if fcntl is None:
+        with _fallback_lock:
+            yield
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _record_id(url: str) -> str:
+    """記事URLからレコードIDを作成（シャードに記事数ぶん並ぶため短くする）"""
+    return _digest(url)[:16]
+
+
+def _pack_key(url: str) -> str:
+    """記事URLのホストとパスの先頭からパックのキーを作成"""
+    parsed = urlparse(url)
+    head = parsed.path.strip("/").split("/", 1)[0]
+    return f"{parsed.hostname or ''}/{head}"
+
+
+class CacheStore:
+    """インデックスとソースごとのシャードで記事キャッシュを管理するクラス"""
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        """
+        CacheStoreの初期化
+
+        Args:
+            root: ストアのディレクトリ（省略時は ~/.cache/sns-post-plugin/store）
+            max_bytes: キャッシュ全体の上限サイズ（超えた場合は古いソースから削除）
+        """
+        self.root = Path(root) if root else DEFAULT_CACHE_DIR / "store"
+        self.max_bytes = max_bytes
+        self.index_file = self.root / "index.json"
+        self.lock_file = self.root / "store.lock"
+        self.shards_dir = self.root / "shards"
+        self.packs_dir = self.root / "packs"
+
+    def _shard_path(self, key: str) -> Path:
+        digest = _digest(key)
+        return self.shards_dir / digest[:2] / f"{digest}.json"
+
+    def _pack_path(self, pack_key: str) -> Path:
+        digest = _digest(pack_key)
+        return self.packs_dir / digest[:2] / f"{digest}.json"
+
+    def _relative(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    def _read_pack(self, path: Path) -> Dict[str, Dict[str, Any]]:
+        try:
+            return _read_json(path)
+        except FileNotFoundError:
+            return {}
+
+    def _load_index(self) -> Dict[str, Any]:
+        try:
+            index = _read_json(self.index_file)
+        except FileNotFoundError:
+            index = {}
+        except Exception as e:
+            logger.error(f"❌ キャッシュインデックス読み込みエラー: {e}")
+            index = {}
+        index.setdefault("sources", {})
+        index.setdefault("packs", {})
+        return index
+
+    def _last_access(self, entry: Dict[str, Any]) -> float:
+        """シャードの更新日時（読み込み時に更新される）を最終アクセス日時として扱う"""
+        try:
+            return (self.root / entry["shard"]).stat().st_mtime
+        except OSError:
+            return 0.0
+
+    @staticmethod
+    def _total(index: Dict[str, Any]) -> int:
+        """シャードと、いずれかのソースから参照されているパックの合計サイズ"""
+        sources = index["sources"].values()
+        packs = {pack for entry in sources for pack in entry.get("packs", [])}
+        return sum(entry.get("bytes", 0) for entry in sources) + sum(index["packs"].get(pack, 0) for pack in packs)
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        ソースのキャッシュデータを読み込む
+
+        インデックスを経由せずシャードと参照先のパックだけを読むため、
+        他のソースの数に読み込み時間が依存しない。
+
+        Args:
+            key: ソースのキー
+
+        Returns:
+            Optional[Dict[str, Any]]: キャッシュデータ（articlesとarchivesの記事は記事レコードに展開済み）
+        """
+        shard_path = self._shard_path(key)
+        try:
+            shard = _read_json(shard_path)
+        except FileNotFoundError:
+            return None
+
+        records: Dict[str, Dict[str, Any]] = {}
+        for pack in shard.get("packs", []):
+            records.update(self._read_pack(self.root / pack))
+
+        articles = []
+        for ref in shard.get("articles", []):
+            record = records.get(ref["id"])
+            if record is None:
+                continue
+            article = dict(record)
+            article.update({field: value for field, value in ref.items() if field != "id"})
+            articles.append(article)
+        shard["articles"] = articles
+
+        for archive_url, entry in shard.get("archives", {}).items():
+            entry["articles"] = [
+                dict(records[record_id], archive_url=archive_url)
+                for record_id in entry.get("articles", [])
+                if record_id in records
+            ]
+
+        try:
+            os.utime(shard_path)
+        except OSError:
+            pass
+
+        return shard
+
+    def save(self, key: str, data: Dict[str, Any]):
+        """
+        ソースのキャッシュデータを保存する
+
+        記事はレコードとしてパックに、ソース固有のフィールドとレコードIDは
+        シャードに保存する。パックは内容が変わった場合だけ書き直す。
+
+        Args:
+            key: ソースのキー
+            data: キャッシュデータ（articlesとarchivesの記事は記事レコードに分割して保存）
+        """
+        packs: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+        def add_record(article: Dict[str, Any]) -> str:
+            record_id = _record_id(article["url"])
+            record = {field: value for field, value in article.items() if field not in SHARD_FIELDS}
+            packs.setdefault(_pack_key(article["url"]), {}).setdefault(record_id, record)
+            return record_id
+
+        refs = []
+        for article in data.get("articles", []):
+            ref = {"id": add_record(article)}
+            ref.update({field: article[field] for field in SHARD_FIELDS if field in article})
+            refs.append(ref)
+
+        archives = {
+            archive_url: dict(entry, articles=[add_record(article) for article in entry.get("articles", [])])
+            for archive_url, entry in data.get("archives", {}).items()
+        }
+
+        with file_lock(self.lock_file):
+            index = self._load_index()
+
+            pack_paths = []
+            for pack_key, records in packs.items():
+                pack_path = self._pack_path(pack_key)
+                pack_name = self._relative(pack_path)
+                pack = self._read_pack(pack_path)
+                if any(pack.get(record_id) != record for record_id, record in records.items()):
+                    pack.update(records)
+                    index["packs"][pack_name] = _write_json(pack_path, pack)
+                elif pack_name not in index["packs"]:
+                    index["packs"][pack_name] = pack_path.stat().st_size
+                pack_paths.append(pack_name)
+            pack_paths.sort()
+
+            # パックを書き込んでからシャードを置き換えるため、読み込み側が参照先のないIDを見ることはない
+            shard = dict(data, source=key, packs=pack_paths, articles=refs, archives=archives)
+            shard_path = self._shard_path(key)
+            shard_bytes = _write_json(shard_path, shard)
+
+            index["sources"][key] = {
+                "shard": self._relative(shard_path),
+                "bytes": shard_bytes,
+                "packs": pack_paths,
+                "articles": len(refs),
+                "last_updated": data.get("last_updated", datetime.now().isoformat()),
+            }
+            _write_json(self.index_file, index)
+            total = self._total(index)
+
+        if self.max_bytes and total > self.max_bytes:
+            self.evict()
+
+    def remove(self, key: str):
+        """ソースのシャードをインデックスから削除する（レコードはcompactで削除）"""
+        with file_lock(self.lock_file):
+            index = self._load_index()
+            index["sources"].pop(key, None)
+            _write_json(self.index_file, index)
+            self._shard_path(key).unlink(missing_ok=True)
+
+    def total_bytes(self) -> int:
+        """インデックスに記録されたキャッシュ全体のサイズ（共有パックは1回だけ計上）"""
+        return self._total(self._load_index())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        キャッシュの使用状況を取得する
+
+        Returns:
+            Dict[str, Any]: ソース数・合計サイズ・ソースごとの情報（bytesはシャードのサイズ）
+        """
+        index = self._load_index()
+        sources = index["sources"]
+        return {
+            "root": str(self.root),
+            "sources": len(sources),
+            "packs": len(index["packs"]),
+            "bytes": self._total(index),
+            "max_bytes": self.max_bytes,
+            "entries": {
+                key: dict(entry, last_access=datetime.fromtimestamp(self._last_access(entry)).isoformat())
+                for key, entry in sources.items()
+            },
+        }
+
+    def evict(self, max_bytes: Optional[int] = None) -> List[str]:
+        """
+        最終アクセスが古いソースから削除し、合計サイズを上限以下にする
+
+        Args:
+            max_bytes: 上限サイズ（省略時はストアの設定値）
+
+        Returns:
+            List[str]: 削除したソースのキー
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        with file_lock(self.lock_file):
+            index = self._load_index()
+            sources = index["sources"]
+            evicted = []
+            for key in sorted(sources, key=lambda k: self._last_access(sources[k])):
+                if self._total(index) <= max_bytes:
+                    break
+                entry = sources.pop(key)
+                (self.root / entry["shard"]).unlink(missing_ok=True)
+                evicted.append(key)
+            if evicted:
+                _write_json(self.index_file, index)
+
+        if evicted:
+            logger.info(f"🧹 {len(evicted)}件のソースをキャッシュから削除: {', '.join(evicted)}")
+            self.compact()
+        return evicted
+
+    def compact(self) -> Dict[str, Any]:
+        """
+        インデックスをシャードから再構築し、参照されていないレコードと中断された一時ファイルを削除する
+
+        Returns:
+            Dict[str, Any]: 圧縮後のソース数・レコード数・削除数
+        """
+        with file_lock(self.lock_file):
+            sources = {}
+            referenced: Set[str] = set()
+            for shard_path in self.shards_dir.glob("*/*.json") if self.shards_dir.exists() else []:
+                try:
+                    shard = _read_json(shard_path)
+                except Exception as e:
+                    logger.error(f"❌ 壊れたシャードを削除: {shard_path} ({e})")
+                    shard_path.unlink(missing_ok=True)
+                    continue
+
+                referenced.update(ref["id"] for ref in shard.get("articles", []))
+                for entry in shard.get("archives", {}).values():
+                    referenced.update(entry.get("articles", []))
+                sources[shard["source"]] = {
+                    "shard": self._relative(shard_path),
+                    "bytes": shard_path.stat().st_size,
+                    "packs": shard.get("packs", []),
+                    "articles": len(shard.get("articles", [])),
+                    "last_updated": shard.get("last_updated"),
+                }
+
+            packs = {}
+            records = 0
+            removed_records = 0
+            for pack_path in self.packs_dir.glob("*/*.json") if self.packs_dir.exists() else []:
+                try:
+                    pack = _read_json(pack_path)
+                except Exception as e:
+                    logger.error(f"❌ 壊れたパックを削除: {pack_path} ({e})")
+                    pack = {}
+                live = {record_id: record for record_id, record in pack.items() if record_id in referenced}
+                removed_records += len(pack) - len(live)
+                records += len(live)
+                if not live:
+                    pack_path.unlink(missing_ok=True)
+                elif len(live) < len(pack):
+                    packs[self._relative(pack_path)] = _write_json(pack_path, live)
+                else:
+                    packs[self._relative(pack_path)] = pack_path.stat().st_size
+
+            # 他のプロセスが書き込み中の一時ファイルは残す
+            cutoff = time.time() - STALE_TMP_SECONDS
+            for tmp_path in self.root.rglob("*.tmp") if self.root.exists() else []:
+                try:
+                    if tmp_path.stat().st_mtime < cutoff:
+                        tmp_path.unlink()
+                except OSError:
+                    pass
+            for directory in [self.shards_dir, self.packs_dir]:
+                for sub_dir in directory.glob("*") if directory.exists() else []:
+                    if sub_dir.is_dir() and not any(sub_dir.iterdir()):
+                        sub_dir.rmdir()
+
+            _write_json(self.index_file, {"sources": sources, "packs": packs})
+
+        result = {"sources": len(sources), "packs": len(packs), "records": records, "removed_records": removed_records}
+        logger.info(f"🗜️ キャッシュを圧縮: {result}")
+        return result
+
+    def clear(self):
+        """ストア全体を削除する"""
+        with file_lock(self.lock_file):
+            for path in self.root.iterdir() if self.root.exists() else []:
+                if path == self.lock_file:
+                    continue
+                if path.is_dir():
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    path.unlink(missing_ok=True)
@@ -1,35 +1,127 @@
 """はてなブログ記事収集・重み付けランダム選出システム"""
 
 import requests
+import hashlib
 import json
-import random
+import threading
 import time
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import multiprocessing
+import queue
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    BrokenExecutor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+
+from .cache_store import CacheStore, DEFAULT_CACHE_DIR
+from .scoring import ScoringEngine
+from .history import PostedHistory
+from .session import default_session
 
 logger = logging.getLogger(__name__)
 
+# 並列取得時のアーカイブページの取得間隔（逐次処理の「10ページごとに1秒待機」と同程度）
+ARCHIVE_PAGES_PER_SECOND = 10
+
+
+class _RateLimiter:
+    """複数スレッドからのリクエストを一定の間隔に制限する"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(self._next, now)
+            self._next = scheduled + self.interval
+        if scheduled > now:
+            time.sleep(scheduled - now)
+
+
+def parse_archive_page(content: bytes, encoding: Optional[str], archive_url: str, blog_url: str) -> List[Dict[str, Any]]:
+    """月別アーカイブページのHTMLから記事リンクを抽出"""
+    soup = BeautifulSoup(content, "html.parser", from_encoding=encoding)
+
+    links = soup.select("a.entry-title-link")
+
+    articles = []
+    for link in links:
+        title = link.text.strip()
+        url = link.get("href")
+        if url and title:
+            if url.startswith("/"):
+                url = blog_url + url
+
+            articles.append({"title": title, "url": url, "archive_url": archive_url})
+    return articles
+
+
+def parse_archive_pages(pages: List[Tuple[bytes, Optional[str], str, str]]) -> List[List[Dict[str, Any]]]:
+    """複数のアーカイブページをまとめて解析（プロセスプール用）"""
+    return [parse_archive_page(*page) for page in pages]
+
 
 class HatenaArchiveCrawler:
-    def __init__(self, blog_url: str = "https://karaage.hatenadiary.jp", cache_file: Optional[str] = None):
+    def __init__(
+        self,
+        blog_url: str = "https://karaage.hatenadiary.jp",
+        cache_file: Optional[str] = None,
+        session: Optional[requests.Session] = None,
+        progress_callback: Optional[Callable[[str, int, int], None]] = None,
+        cache_store: Optional[CacheStore] = None,
+        history: Optional[PostedHistory] = None,
+    ):
         self.blog_url = blog_url
+        # 進捗通知用のコールバック（stage, completed, total）
+        self.progress_callback = progress_callback
+        # クロール中に収集済みの記事（暫定選出用）
+        self.collected_articles: List[Dict[str, Any]] = []
+        # アーカイブURLごとのETag/Last-Modified/コンテンツハッシュと記事リスト（キャッシュから遅延読み込み）
+        self._archive_index: Optional[Dict[str, Dict[str, Any]]] = None
+        self._archive_index_lock = threading.Lock()
 
         if cache_file:
+            # キャッシュファイルを指定した場合は単一ファイルに保存
             self.cache_file = Path(cache_file)
+            self.cache_store = None
         else:
-            # デフォルトのキャッシュディレクトリ
-            cache_dir = Path.home() / ".cache" / "sns-post-plugin"
-            cache_dir.mkdir(parents=True, exist_ok=True)
-            # ブログURLからキャッシュファイル名を生成
+            self.cache_file = None
+            self.cache_store = cache_store if cache_store is not None else CacheStore()
+            self.cache_key = f"hatena:{blog_url.rstrip('/')}"
+            # 旧形式（ブログごとの単一ファイル）のキャッシュ。見つかればストアに移行する
             blog_name = blog_url.replace("https://", "").replace("http://", "").replace("/", "_")
-            self.cache_file = cache_dir / f"{blog_name}_cache.json"
+            self.legacy_cache_file = DEFAULT_CACHE_DIR / f"{blog_name}_cache.json"
+
+        # ブックマーク数による重み付け（ブックマークのない記事も選ばれるよう基本スコアを加算）
+        # ブックマークのある記事を合計70%の確率で（ブックマーク数 + 1 に比例）、ない記事を30%の確率で均等に選出する
+        self.scoring_engine = ScoringEngine(
+            likes_weight=0.0, bookmarks_weight=1.0, base_weight=1.0, popularity="linear", popular_share=0.7
+        )
+        # 選出済み記事の履歴（指定時はクールダウン中の記事を避ける）
+        self.history = history
 
-        self.session = requests.Session()
-        self.session.headers.update({"User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36"})
+        self.session = default_session(session, user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36")
+
+    def _report_progress(self, stage: str, completed: int, total: int):
+        """進捗をコールバックに通知（"archive": アーカイブページ、"bookmark": ブックマーク数）"""
+        if self.progress_callback is None:
+            return
+        try:
+            self.progress_callback(stage, completed, total)
+        except Exception as e:
+            logger.error(f"⚠️ 進捗通知エラー: {e}")
 
     def generate_archive_urls(self, start_year: int = 2014, end_year: Optional[int] = None) -> List[str]:
         """月別アーカイブURLを生成"""
@@ -45,42 +137,118 @@ class HatenaArchiveCrawler:
                 archive_urls.append(url)
         return archive_urls
 
-    def fetch_articles_from_archive(self, archive_url: str) -> List[Dict[str, Any]]:
-        """月別アーカイブページから記事リンクを抽出"""
-        try:
-            response = self.session.get(archive_url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, "html.parser")
-
-            links = soup.select("a.entry-title-link")
+    def _read_cache_data(self) -> Optional[Dict[str, Any]]:
+        """キャッシュデータを読み込み（存在しない場合はNone）"""
+        if self.cache_store is None:
+            if not self.cache_file.exists():
+                return None
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                return json.load(f)
 
-            articles = []
-            for link in links:
-                title = link.text.strip()
-                url = link.get("href")
-                if url and title:
-                    if url.startswith("/"):
-                        url = self.blog_url + url
+        cache_data = self.cache_store.load(self.cache_key)
+        if cache_data is None and self.legacy_cache_file.exists():
+            with open(self.legacy_cache_file, "r", encoding="utf-8") as f:
+                cache_data = json.load(f)
+            self.cache_store.save(self.cache_key, cache_data)
+            self.legacy_cache_file.unlink()
+            logger.info(f"📦 旧形式のキャッシュをストアに移行: {self.legacy_cache_file}")
+        return cache_data
+
+    def _get_archive_index(self) -> Dict[str, Dict[str, Any]]:
+        """キャッシュからアーカイブごとの検証情報を読み込み（キャッシュの鮮度によらず使用）"""
+        with self._archive_index_lock:
+            if self._archive_index is None:
+                self._archive_index = {}
+                try:
+                    cache_data = self._read_cache_data()
+                    if cache_data:
+                        self._archive_index = cache_data.get("archives", {})
+                except Exception as e:
+                    logger.error(f"❌ アーカイブ情報の読み込みエラー: {e}")
+            return self._archive_index
+
+    def _download_archive(self, archive_url: str) -> Tuple[Optional[List[Dict[str, Any]]], Optional[Dict[str, Any]]]:
+        """
+        アーカイブページを条件付きリクエストで取得
+
+        変更がなければ保存済みの記事リストを、変更があれば解析前のページを返す。
+        """
+        entry = self._get_archive_index().get(archive_url)
+
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self.session.get(archive_url, timeout=10, headers=headers)
+
+        if response.status_code == 304 and entry:
+            logger.info(f"♻️ {archive_url}: 変更なし（304）")
+            return [dict(article) for article in entry["articles"]], None
+
+        response.raise_for_status()
+        content_hash = hashlib.sha256(response.content).hexdigest()
+
+        if entry and entry.get("content_hash") == content_hash:
+            entry["etag"] = response.headers.get("ETag")
+            entry["last_modified"] = response.headers.get("Last-Modified")
+            logger.info(f"♻️ {archive_url}: 変更なし（ハッシュ一致）")
+            return [dict(article) for article in entry["articles"]], None
+
+        page = {
+            "archive_url": archive_url,
+            "content": response.content,
+            "encoding": response.encoding,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_hash": content_hash,
+        }
+        return None, page
+
+    def _store_archive(self, page: Dict[str, Any], articles: List[Dict[str, Any]]):
+        """解析結果と検証情報をアーカイブごとのインデックスに保存"""
+        self._get_archive_index()[page["archive_url"]] = {
+            "etag": page["etag"],
+            "last_modified": page["last_modified"],
+            "content_hash": page["content_hash"],
+            "articles": [dict(article) for article in articles],
+        }
+        logger.info(f"✅ {page['archive_url']}: {len(articles)}件の記事を取得")
 
-                    articles.append({"title": title, "url": url, "archive_url": archive_url})
+    def fetch_articles_from_archive(self, archive_url: str) -> List[Dict[str, Any]]:
+        """月別アーカイブページから記事リンクを抽出（変更のないページは解析を省略）"""
+        try:
+            articles, page = self._download_archive(archive_url)
+            if page is None:
+                return articles
 
-            logger.info(f"✅ {archive_url}: {len(articles)}件の記事を取得")
+            articles = parse_archive_page(page["content"], page["encoding"], archive_url, self.blog_url)
+            self._store_archive(page, articles)
             return articles
 
         except Exception as e:
             logger.error(f"❌ エラー {archive_url}: {e}")
             return []
 
-    def collect_all_articles(self, start_year: int = 2014) -> List[Dict[str, Any]]:
-        """全期間の記事を収集"""
+    def collect_all_articles(
+        self, start_year: int = 2014, parse_workers: int = 0, fetch_workers: int = 2
+    ) -> List[Dict[str, Any]]:
+        """全期間の記事を収集（parse_workersを指定するとfetch_workersスレッドで取得し、HTMLの解析をプロセスプールで行う）"""
         archive_urls = self.generate_archive_urls(start_year)
+        if parse_workers > 0:
+            return self._collect_with_process_pool(archive_urls, parse_workers, fetch_workers=fetch_workers)
+
         all_articles = []
+        self.collected_articles = all_articles
 
         logger.info(f"📚 {len(archive_urls)}個のアーカイブページをクロール開始...")
 
         for i, url in enumerate(archive_urls):
             articles = self.fetch_articles_from_archive(url)
             all_articles.extend(articles)
+            self._report_progress("archive", i + 1, len(archive_urls))
 
             if i % 10 == 0:
                 time.sleep(1)
@@ -91,6 +259,116 @@ class HatenaArchiveCrawler:
         logger.info(f"🎉 収集完了: 合計{len(all_articles)}件の記事")
         return all_articles
 
+    def _parse_payload(self, pages: List[Dict[str, Any]]) -> List[Tuple[bytes, Optional[str], str, str]]:
+        """parse_archive_pagesに渡す引数を作成"""
+        return [(page["content"], page["encoding"], page["archive_url"], self.blog_url) for page in pages]
+
+    def _collect_with_process_pool(
+        self,
+        archive_urls: List[str],
+        parse_workers: int,
+        fetch_workers: int = 2,
+        batch_size: int = 8,
+        queue_size: int = 32,
+    ) -> List[Dict[str, Any]]:
+        """
+        アーカイブページの取得（スレッド）と解析（プロセスプール）を分けて全記事を収集
+
+        取得したページは上限付きのキューを経由して解析に渡すため、解析が
+        追いつかない場合は取得側が待機する。解析はbatch_size件ずつまとめて行う。
+        取得スレッドは合計で毎秒ARCHIVE_PAGES_PER_SECONDページまでに制限する。
+        """
+        rate_limiter = _RateLimiter(ARCHIVE_PAGES_PER_SECOND)
+        pages: queue.Queue = queue.Queue(maxsize=queue_size)
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        results_lock = threading.Lock()
+        self.collected_articles = []
+
+        def add_result(archive_url: str, articles: List[Dict[str, Any]]):
+            # 取得スレッドと解析側から同時に呼ばれるため、進捗が前後しないようロック内で通知する
+            with results_lock:
+                results[archive_url] = articles
+                self.collected_articles.extend(articles)
+                self._report_progress("archive", len(results), len(archive_urls))
+
+        def download(archive_url: str):
+            rate_limiter.wait()
+            try:
+                articles, page = self._download_archive(archive_url)
+            except Exception as e:
+                logger.error(f"❌ エラー {archive_url}: {e}")
+                add_result(archive_url, [])
+                return
+            if page is None:
+                add_result(archive_url, articles)
+            else:
+                pages.put(page)
+
+        def produce():
+            try:
+                with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+                    list(executor.map(download, archive_urls))
+            finally:
+                pages.put(None)
+
+        logger.info(
+            f"📚 {len(archive_urls)}個のアーカイブページをクロール開始（取得{fetch_workers}スレッド、解析{parse_workers}プロセス）..."
+        )
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+
+        in_flight: Dict[Future, List[Dict[str, Any]]] = {}
+        max_in_flight = parse_workers * 2
+        producing = True
+
+        with ProcessPoolExecutor(max_workers=parse_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            while producing or in_flight:
+                done = [future for future in in_flight if future.done()]
+                for future in done:
+                    batch = in_flight.pop(future)
+                    try:
+                        parsed = future.result()
+                    except Exception as e:
+                        logger.error(f"⚠️ プロセスプールでの解析に失敗したため、このプロセスで解析します: {e}")
+                        parsed = parse_archive_pages(self._parse_payload(batch))
+                    for page, articles in zip(batch, parsed):
+                        self._store_archive(page, articles)
+                        add_result(page["archive_url"], articles)
+
+                if not producing or len(in_flight) >= max_in_flight:
+                    if in_flight:
+                        wait(in_flight, return_when=FIRST_COMPLETED)
+                    continue
+
+                batch = []
+                try:
+                    page = pages.get(timeout=0.1)
+                    while page is not None:
+                        batch.append(page)
+                        if len(batch) >= batch_size:
+                            break
+                        page = pages.get_nowait()
+                except queue.Empty:
+                    page = False
+                if page is None:
+                    producing = False
+
+                if batch:
+                    try:
+                        in_flight[pool.submit(parse_archive_pages, self._parse_payload(batch))] = batch
+                    except BrokenExecutor as e:
+                        logger.error(f"⚠️ プロセスプールが利用できないため、このプロセスで解析します: {e}")
+                        for page, articles in zip(batch, parse_archive_pages(self._parse_payload(batch))):
+                            self._store_archive(page, articles)
+                            add_result(page["archive_url"], articles)
+
+        producer.join()
+
+        all_articles = [article for archive_url in archive_urls for article in results.get(archive_url, [])]
+        logger.info(f"🎉 収集完了: 合計{len(all_articles)}件の記事")
+        return all_articles
+
     def get_hatena_bookmark_count(self, url: str) -> Optional[int]:
         """はてなブックマーク数を取得"""
         try:
@@ -149,12 +427,15 @@ class HatenaArchiveCrawler:
                         error_count += 1
 
                     completed += 1
+                    self._report_progress("bookmark", completed, len(articles))
                     if completed % 50 == 0:
                         logger.info(
                             f"📊 進捗: {completed}/{len(articles)} | 成功: {success_count}, ブックマークあり: {bookmark_found_count}"
                         )
                 except Exception as e:
                     error_count += 1
+                    completed += 1
+                    self._report_progress("bookmark", completed, len(articles))
                     logger.error(f"❌ ブックマーク取得エラー: {e}")
 
         success_rate = (success_count / len(articles)) * 100 if articles else 0
@@ -164,22 +445,27 @@ class HatenaArchiveCrawler:
         return articles
 
     def save_cache(self, articles: List[Dict[str, Any]]):
-        """記事データをキャッシュファイルに保存"""
-        cache_data = {"last_updated": datetime.now().isoformat(), "articles": articles}
-
-        with open(self.cache_file, "w", encoding="utf-8") as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
-
-        logger.info(f"💾 キャッシュを保存: {self.cache_file}")
+        """記事データをキャッシュに保存"""
+        cache_data = {
+            "last_updated": datetime.now().isoformat(),
+            "articles": articles,
+            "archives": self._get_archive_index(),
+        }
+
+        if self.cache_store is None:
+            with open(self.cache_file, "w", encoding="utf-8") as f:
+                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            logger.info(f"💾 キャッシュを保存: {self.cache_file}")
+        else:
+            self.cache_store.save(self.cache_key, cache_data)
+            logger.info(f"💾 キャッシュを保存: {self.cache_key}")
 
     def load_cache(self) -> Optional[List[Dict[str, Any]]]:
-        """キャッシュファイルから記事データを読み込み"""
-        if not self.cache_file.exists():
-            return None
-
+        """キャッシュから記事データを読み込み"""
         try:
-            with open(self.cache_file, "r", encoding="utf-8") as f:
-                cache_data = json.load(f)
+            cache_data = self._read_cache_data()
+            if cache_data is None:
+                return None
 
             last_updated = datetime.fromisoformat(cache_data["last_updated"])
             if datetime.now() - last_updated > timedelta(days=1):
@@ -193,41 +479,44 @@ class HatenaArchiveCrawler:
             logger.error(f"❌ キャッシュ読み込みエラー: {e}")
             return None
 
-    def weighted_random_selection(self, articles: List[Dict[str, Any]], exclude_recent_days: int = 30) -> Dict[str, Any]:
-        """重み付けランダム選出"""
-        cutoff_date = datetime.now() - timedelta(days=exclude_recent_days)
-
-        bookmarked_articles = [article for article in articles if article.get("bookmark_count", 0) > 0]
-        no_bookmark_articles = [article for article in articles if article.get("bookmark_count", 0) == 0]
-
-        if bookmarked_articles:
-            if random.random() < 0.7 and bookmarked_articles:
-                selected_articles = bookmarked_articles
-                weights = [article.get("bookmark_count", 0) + 1 for article in selected_articles]
-                selection_type = "ブックマーク重み付き"
-            else:
-                selected_articles = no_bookmark_articles if no_bookmark_articles else articles
-                weights = [1 for _ in selected_articles]
-                selection_type = "ランダム"
-        else:
-            selected_articles = articles
-            weights = [1 for _ in selected_articles]
-            selection_type = "全記事ランダム"
-
-        if not selected_articles:
-            selected_articles = articles
-            weights = [1 for _ in selected_articles]
-            selection_type = "フォールバック"
-
-        selected_article = random.choices(selected_articles, weights=weights, k=1)[0]
+    def weighted_random_selection(
+        self,
+        articles: List[Dict[str, Any]],
+        exclude_recent_days: int = 30,
+        random_seed: Optional[int] = None,
+        cooldown_days: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """重み付けランダム選出（ブックマーク数で重み付けし、公開から日が浅い記事と選出済みの記事は除外）"""
+        exclude = self.history.cooldown_mask(articles, cooldown_days) if self.history else None
+        selected = self.scoring_engine.select(
+            articles, k=1, random_seed=random_seed, exclude_recent_days=exclude_recent_days, exclude=exclude
+        )
+        if not selected:
+            raise ValueError("記事が見つかりませんでした")
+        selected_article = selected[0]
+        if self.history:
+            self.history.record(selected)
 
         logger.info(f"🎯 選出された記事: {selected_article['title']}")
         logger.info(f"📖 ブックマーク数: {selected_article.get('bookmark_count', 0)}")
-        logger.info(f"🎲 選択方法: {selection_type}")
 
         return selected_article
 
-    def run_full_crawl(self, start_year: int = 2014, use_cache: bool = True) -> tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    def refresh_articles(self, start_year: int = 2014, parse_workers: int = 0, fetch_workers: int = 2) -> List[Dict[str, Any]]:
+        """全記事とブックマーク数を取得してキャッシュを更新"""
+        articles = self.collect_all_articles(start_year=start_year, parse_workers=parse_workers, fetch_workers=fetch_workers)
+        articles = self.fetch_bookmark_counts(articles)
+        self.save_cache(articles)
+        return articles
+
+    def run_full_crawl(
+        self,
+        start_year: int = 2014,
+        use_cache: bool = True,
+        cooldown_days: Optional[int] = None,
+        parse_workers: int = 0,
+        fetch_workers: int = 2,
+    ) -> tuple[Dict[str, Any], List[Dict[str, Any]]]:
         """フルクロール実行"""
         cached_articles = self.load_cache() if use_cache else None
 
@@ -235,10 +524,8 @@ class HatenaArchiveCrawler:
             articles = cached_articles
             logger.info(f"📋 キャッシュから{len(articles)}件の記事を使用")
         else:
-            articles = self.collect_all_articles(start_year=start_year)
-            articles = self.fetch_bookmark_counts(articles)
-            self.save_cache(articles)
+            articles = self.refresh_articles(start_year=start_year, parse_workers=parse_workers, fetch_workers=fetch_workers)
 
-        selected_article = self.weighted_random_selection(articles)
+        selected_article = self.weighted_random_selection(articles, cooldown_days=cooldown_days)
 
         return selected_article, articles
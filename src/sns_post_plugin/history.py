@@ -0,0 +1,149 @@
+"""選出済み記事の履歴を管理するモジュール
+
+履歴は追記専用のログファイル（1行に「URLハッシュ 選出時刻」）に保存し、
+読み込み時にURLハッシュから最終選出時刻へのハッシュ表を作る。ログは
+MCPサーバーとバッチ処理など複数のプロセスで共有されるため、追記と圧縮は
+ロックファイルで排他し、参照のたびに他のプロセスの追記を読み足す。
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .cache_store import DEFAULT_CACHE_DIR, file_lock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COOLDOWN_DAYS = 30
+# これより古い履歴は圧縮時に削除する
+RETENTION_DAYS = 365
+
+
+class PostedHistory:
+    """選出済み記事の履歴を管理するクラス"""
+
+    def __init__(self, path: Optional[Path] = None, cooldown_days: int = DEFAULT_COOLDOWN_DAYS):
+        """
+        PostedHistoryの初期化
+
+        Args:
+            path: 履歴ログのパス（省略時は ~/.cache/sns-post-plugin/posted_history.log）
+            cooldown_days: 同じ記事を再び選出しない日数のデフォルト値
+        """
+        self.path = Path(path) if path else DEFAULT_CACHE_DIR / "posted_history.log"
+        self.cooldown_days = cooldown_days
+        self.lock_path = self.path.with_name(f"{self.path.name}.lock")
+        self._posted: Optional[Dict[str, float]] = None
+        self._inode: Optional[int] = None
+        self._offset = 0
+        self._lines = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def article_key(article: Dict[str, Any]) -> str:
+        """記事のguid（なければURL）から履歴のキーを作成"""
+        identifier = article.get("guid") or article.get("url", "")
+        return hashlib.sha1(identifier.encode("utf-8")).hexdigest()[:16]
+
+    def _load(self) -> Dict[str, float]:
+        """ログの変更分を読み込む（ロック取得済みで呼ぶ）
+
+        他のプロセスが追記した行は前回の読み込み位置から読み足し、
+        圧縮で書き直された場合は全体を読み直す。
+        """
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            self._posted, self._inode, self._offset, self._lines = {}, None, 0, 0
+            return self._posted
+
+        if self._posted is not None and stat.st_ino == self._inode and stat.st_size == self._offset:
+            return self._posted
+        if self._posted is None or stat.st_ino != self._inode or stat.st_size < self._offset:
+            self._posted, self._inode, self._offset, self._lines = {}, stat.st_ino, 0, 0
+
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read()
+        # 書き込み途中の行は次回の読み込みに回す
+        end = data.rfind(b"\n") + 1
+        self._offset += end
+
+        posted = self._posted
+        for line in data[:end].decode("utf-8", errors="replace").splitlines():
+            parts = line.split()
+            if len(parts) != 2:
+                continue
+            self._lines += 1
+            try:
+                posted[parts[0]] = max(posted.get(parts[0], 0.0), float(parts[1]))
+            except ValueError:
+                continue
+        return posted
+
+    def _rewrite(self, posted: Dict[str, float]):
+        """最新の選出時刻だけを残してログを書き直す（ファイルロック取得済みで呼ぶ）"""
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.writelines(f"{key} {posted_at:.0f}\n" for key, posted_at in posted.items())
+        os.replace(tmp_path, self.path)
+        logger.info(f"🗜️ 選出履歴を圧縮: {len(posted)}件")
+
+    def last_posted(self, article: Dict[str, Any]) -> Optional[float]:
+        """記事が最後に選出された時刻（UNIX時間、未選出ならNone）"""
+        with self._lock:
+            return self._load().get(self.article_key(article))
+
+    def cooldown_mask(self, articles: List[Dict[str, Any]], cooldown_days: Optional[float] = None) -> np.ndarray:
+        """
+        クールダウン期間中の記事を示すマスクを作成する
+
+        Args:
+            articles: 記事情報のリスト
+            cooldown_days: 再選出しない日数（省略時はデフォルト値、0以下で無効）
+
+        Returns:
+            np.ndarray: クールダウン中の記事がTrueの配列
+        """
+        cooldown_days = self.cooldown_days if cooldown_days is None else cooldown_days
+        if cooldown_days <= 0:
+            return np.zeros(len(articles), dtype=bool)
+
+        cutoff = time.time() - cooldown_days * 86400
+        with self._lock:
+            posted = self._load()
+            return np.fromiter(
+                (posted.get(self.article_key(article), 0.0) >= cutoff for article in articles),
+                dtype=bool,
+                count=len(articles),
+            )
+
+    def record(self, articles: List[Dict[str, Any]]):
+        """
+        選出した記事を履歴に追記する
+
+        Args:
+            articles: 選出した記事のリスト
+        """
+        if not articles:
+            return
+
+        now = time.time()
+        with self._lock, file_lock(self.lock_path):
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(f"{self.article_key(article)} {now:.0f}\n" for article in articles)
+            posted = self._load()
+
+            # 重複や期限切れの行が多ければ、ロックを保持したまま最新の内容で書き直す
+            cutoff = now - RETENTION_DAYS * 86400
+            live = {key: posted_at for key, posted_at in posted.items() if posted_at >= cutoff}
+            if self._lines > 1000 and self._lines > 2 * len(live):
+                self._rewrite(live)
+                self._posted = None
+                self._load()
@@ -0,0 +1,300 @@
+"""記事の人気度スコアリングと選出を行うモジュール
+
+Zenn、Qiita、はてなブログの記事を共通の列（いいね数、ブックマーク数、
+経過日数、タグの一致数）に変換し、NumPyでまとめてスコアを計算する。
+"""
+
+import logging
+import re
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 経過日数（日）と半減期（日）から減衰係数を計算する関数
+DecayFunction = Callable[[np.ndarray, float], np.ndarray]
+
+DECAY_FUNCTIONS: Dict[str, DecayFunction] = {
+    "none": lambda age, half_life: np.ones_like(age),
+    "exponential": lambda age, half_life: np.exp2(-age / half_life),
+    "inverse": lambda age, half_life: half_life / (half_life + age),
+    "linear": lambda age, half_life: np.clip(1.0 - age / (2.0 * half_life), 0.0, 1.0),
+}
+
+# いいね数・ブックマーク数をスコアに変換する方法
+#   log:    log(1 + 件数)
+#   linear: 件数そのもの
+#   rank:   重み付き件数の順位rに対して 1 / (r + 1)（上位rank_limit件のみ、それ以外は0）
+POPULARITY_SCALES = ("log", "linear", "rank")
+
+ENTRY_DATE_PATTERN = re.compile(r"/entry/(\d{4})/(\d{2})/(\d{2})")
+TITLE_NORMALIZE_PATTERN = re.compile(r"[\W_]+")
+
+
+def register_decay(name: str, decay: DecayFunction):
+    """
+    減衰関数を登録する
+
+    Args:
+        name: 減衰関数の名前
+        decay: 経過日数の配列と半減期を受け取り、減衰係数の配列を返す関数
+    """
+    DECAY_FUNCTIONS[name] = decay
+
+
+def _published_at(article: Dict[str, Any]) -> Optional[datetime]:
+    """記事の公開日時を取得（published_at、なければはてなブログのURLの日付）"""
+    published_at = article.get("published_at")
+    if published_at:
+        try:
+            value = datetime.fromisoformat(published_at.replace("Z", "+00:00"))
+            return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+
+    match = ENTRY_DATE_PATTERN.search(article.get("url", ""))
+    if match:
+        try:
+            return datetime(*map(int, match.groups()), tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    return None
+
+
+def _normalize_title(title: str) -> str:
+    return TITLE_NORMALIZE_PATTERN.sub("", title.lower())
+
+
+def _trigrams(text: str) -> Set[str]:
+    if len(text) < 3:
+        return {text}
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class ArticleColumns:
+    """記事リストを列指向の配列に変換したもの"""
+
+    def __init__(self, articles: List[Dict[str, Any]], preferred_tags: Optional[List[str]] = None):
+        """
+        ArticleColumnsの初期化
+
+        Args:
+            articles: 記事情報のリスト
+            preferred_tags: 一致数を計算するタグ（省略時は一致数0）
+        """
+        now = datetime.now(timezone.utc)
+        preferred = {tag.lower() for tag in preferred_tags or []}
+
+        self.articles = articles
+        self.likes = np.fromiter((article.get("likes") or 0 for article in articles), dtype=np.float64, count=len(articles))
+        self.bookmarks = np.fromiter(
+            (article.get("bookmark_count") or 0 for article in articles), dtype=np.float64, count=len(articles)
+        )
+
+        published = [_published_at(article) for article in articles]
+        # 公開日時が不明な記事の経過日数はNaN
+        self.age_days = np.fromiter(
+            ((now - value).total_seconds() / 86400 if value else np.nan for value in published),
+            dtype=np.float64,
+            count=len(articles),
+        )
+
+        self.tags = [[tag.lower() for tag in article.get("tags") or []] for article in articles]
+        self.tag_overlap = np.fromiter(
+            (len(preferred.intersection(tags)) for tags in self.tags), dtype=np.float64, count=len(articles)
+        )
+        self.title_keys = np.array([_normalize_title(article.get("title", "")) for article in articles], dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.articles)
+
+
+class ScoringEngine:
+    """記事の人気度スコアを計算し、多様性を考慮して選出するクラス"""
+
+    def __init__(
+        self,
+        likes_weight: float = 1.0,
+        bookmarks_weight: float = 1.0,
+        tags_weight: float = 1.0,
+        base_weight: float = 0.1,
+        decay: str = "none",
+        half_life_days: float = 365.0,
+        title_similarity: float = 0.8,
+        popularity: str = "log",
+        rank_limit: int = 100,
+        popular_share: Optional[float] = None,
+    ):
+        """
+        ScoringEngineの初期化
+
+        Args:
+            likes_weight: いいね数の重み
+            bookmarks_weight: ブックマーク数の重み
+            tags_weight: タグの一致数の重み
+            base_weight: すべての記事に加算する基本スコア（0件の記事も選ばれるようにする）
+            decay: 経過日数による減衰関数の名前（DECAY_FUNCTIONSのキー）
+            half_life_days: 減衰関数の半減期（日）
+            title_similarity: タイトルをほぼ同一とみなす文字3-gramのJaccard係数
+            popularity: いいね数・ブックマーク数の変換方法（POPULARITY_SCALESのいずれか）
+            rank_limit: popularityが"rank"の場合に重みを与える上位件数
+            popular_share: いいね・ブックマークが1件以上の記事の選出確率の合計
+                （指定時はスコアをこの割合になるように調整、Noneの場合は調整しない）
+        """
+        if decay not in DECAY_FUNCTIONS:
+            raise ValueError(f"Unknown decay function: {decay}")
+        if popularity not in POPULARITY_SCALES:
+            raise ValueError(f"Unknown popularity scale: {popularity}")
+        if popular_share is not None and not 0.0 < popular_share < 1.0:
+            raise ValueError("popular_share must be between 0 and 1")
+
+        self.likes_weight = likes_weight
+        self.bookmarks_weight = bookmarks_weight
+        self.tags_weight = tags_weight
+        self.base_weight = base_weight
+        self.decay = decay
+        self.half_life_days = half_life_days
+        self.title_similarity = title_similarity
+        self.popularity = popularity
+        self.rank_limit = rank_limit
+        self.popular_share = popular_share
+
+    def _popularity(self, columns: ArticleColumns, excluded: Optional[np.ndarray] = None) -> np.ndarray:
+        """いいね数・ブックマーク数によるスコアを計算する（順位は除外されていない記事の中で決める）"""
+        if self.popularity == "rank":
+            raw = self.likes_weight * columns.likes + self.bookmarks_weight * columns.bookmarks
+            if excluded is not None:
+                raw = np.where(excluded, -np.inf, raw)
+            ranks = np.empty(len(columns), dtype=np.float64)
+            ranks[np.argsort(-raw, kind="stable")] = np.arange(len(columns))
+            return np.where(ranks < self.rank_limit, 1.0 / (ranks + 1.0), 0.0)
+
+        transform = np.log1p if self.popularity == "log" else np.asarray
+        return self.likes_weight * transform(columns.likes) + self.bookmarks_weight * transform(columns.bookmarks)
+
+    def score(self, columns: ArticleColumns, excluded: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        全記事のスコアを計算する
+
+        Args:
+            columns: 記事の列データ
+            excluded: 除外する記事を示すマスク（除外した記事のスコアは0）
+
+        Returns:
+            np.ndarray: 記事ごとのスコア
+        """
+        scores = self.base_weight + self._popularity(columns, excluded) + self.tags_weight * columns.tag_overlap
+        if excluded is not None:
+            scores = np.where(excluded, 0.0, scores)
+        # 公開日時が不明な記事は減衰させない
+        age = np.nan_to_num(np.clip(columns.age_days, 0.0, None), nan=0.0)
+        return scores * DECAY_FUNCTIONS[self.decay](age, self.half_life_days)
+
+    def select(
+        self,
+        articles: List[Dict[str, Any]],
+        k: int = 1,
+        random_seed: Optional[int] = None,
+        exclude_recent_days: Optional[float] = None,
+        exclude: Optional[np.ndarray] = None,
+        preferred_tags: Optional[List[str]] = None,
+        diverse: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        スコアに比例した確率で記事を重複なくk件選出する
+
+        Gumbel-top-kで全記事の抽選順をまとめて決め、その順にタグの重複や
+        ほぼ同一のタイトルを除外する。条件を満たす記事が足りない場合は
+        除外した記事から抽選順に補う。
+
+        Args:
+            articles: 記事情報のリスト
+            k: 選出する記事数
+            random_seed: ランダムシード（Noneの場合は毎回異なる結果）
+            exclude_recent_days: 公開からこの日数以内の記事を除外（除外後に記事が残らない場合は無視）
+            exclude: 除外する記事を示すマスク（除外後に記事が残らない場合は無視）
+            preferred_tags: スコアを加点するタグ
+            diverse: タグやタイトルが重複しないように選出するか
+
+        Returns:
+            List[Dict[str, Any]]: 選出された記事のリスト
+        """
+        if not articles or k <= 0:
+            return []
+
+        columns = ArticleColumns(articles, preferred_tags=preferred_tags)
+
+        masks = []
+        if exclude_recent_days is not None:
+            masks.append(columns.age_days < exclude_recent_days)
+        if exclude is not None:
+            masks.append(np.asarray(exclude, dtype=bool))
+
+        excluded = np.zeros(len(columns), dtype=bool)
+        for mask in masks:
+            if not (excluded | mask).all():
+                excluded |= mask
+        scores = self.score(columns, excluded)
+
+        if self.popular_share is not None:
+            # いいね・ブックマークのある記事とない記事の確率の合計を popular_share : 1 - popular_share にする
+            popular = (columns.likes + columns.bookmarks) > 0
+            popular_total = scores[popular].sum()
+            other_total = scores[~popular].sum()
+            if popular_total > 0 and other_total > 0:
+                scale = self.popular_share / (1.0 - self.popular_share) * other_total / popular_total
+                scores = np.where(popular, scores * scale, scores)
+
+        if not (scores > 0).any():
+            # スコアがすべて0の場合は除外されていない記事から均等に選出する
+            scores = np.where(excluded, 0.0, 1.0) if not excluded.all() else np.ones(len(columns))
+
+        rng = np.random.default_rng(random_seed)
+        with np.errstate(divide="ignore"):
+            keys = np.log(scores) + rng.gumbel(size=len(columns))
+        order = np.argsort(-keys, kind="stable")
+        order = order[scores[order] > 0]
+
+        if not diverse:
+            return [articles[i] for i in order[:k]]
+
+        # 正規化後に同じタイトルの記事は抽選順で最初のものだけを候補にする
+        _, first = np.unique(columns.title_keys[order], return_index=True)
+        candidates = order[np.sort(first)]
+
+        selected: List[int] = []
+        selected_trigrams: List[Set[str]] = []
+        used_tags: Set[str] = set()
+        for i in candidates:
+            if len(selected) >= k:
+                break
+            tags = columns.tags[i]
+            trigrams = _trigrams(columns.title_keys[i])
+            if used_tags.intersection(tags) or any(
+                len(trigrams & other) / len(trigrams | other) >= self.title_similarity for other in selected_trigrams
+            ):
+                continue
+            selected.append(i)
+            selected_trigrams.append(trigrams)
+            used_tags.update(tags)
+
+        if len(selected) < k:
+            selected_set = set(selected)
+            remaining = [i for i in order if i not in selected_set]
+            selected.extend(remaining[: k - len(selected)])
+
+        return [articles[i] for i in selected]
+
+
+def likes_rank_engine() -> ScoringEngine:
+    """
+    ZennとQiitaで使用するスコアリングエンジンを作成する
+
+    いいね数の上位100件から、順位rの記事を 1 / (r + 1) に比例した確率で選出する。
+
+    Returns:
+        ScoringEngine: いいね数の順位で重み付けするエンジン
+    """
+    return ScoringEngine(likes_weight=1.0, bookmarks_weight=0.0, base_weight=0.0, popularity="rank")
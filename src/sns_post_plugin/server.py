@@ -3,8 +3,10 @@
 Zenn、Qiita、はてなブログの記事を取得するためのMCPサーバー
 """
 
+import asyncio
 import json
 import logging
+import sys
 from typing import Optional
 from mcp.server.models import InitializationOptions
 import mcp.types as types
@@ -14,12 +16,133 @@ import mcp.server.stdio
 from .zenn_fetcher import ZennDataFetcher
 from .hatena_fetcher import HatenaArchiveCrawler
 from .qiita_fetcher import QiitaDataFetcher
+from .batch import BatchRunner, load_accounts, parse_host_limits
+from .cache_store import CacheStore
+from .history import PostedHistory
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 server = Server("sns-post-plugin")
 
+# 選出済み記事の履歴（全ツールで共有）
+posted_history = PostedHistory()
+
+
+class HatenaCrawlJob:
+    """バックグラウンドで実行中のはてなブログのクロール"""
+
+    def __init__(self, crawler: HatenaArchiveCrawler):
+        self.crawler = crawler
+        self.crawler.progress_callback = self.notify
+        self.listeners: list = []
+        self.archive_total = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self, stage: str, completed: int, total: int):
+        """クローラーの進捗を登録済みのリスナーに転送（クロールスレッドから呼ばれる）"""
+        if stage == "archive":
+            self.archive_total = total
+            progress, overall = completed, total
+            message = f"アーカイブページ {completed}/{total}"
+        else:
+            progress, overall = self.archive_total + completed, self.archive_total + total
+            message = f"ブックマーク数 {completed}/{total}"
+
+        for listener in list(self.listeners):
+            listener(progress, overall, message)
+
+
+# 実行中のクロール（同じブログへの同時リクエストは1つのクロールを共有する）
+hatena_crawl_jobs: dict[tuple[str, int], HatenaCrawlJob] = {}
+
+
+def _progress_listener(job: HatenaCrawlJob, progress_token, loop: asyncio.AbstractEventLoop):
+    """進捗をMCPのprogress notificationとして送信するリスナーを作成"""
+    session = server.request_context.session
+
+    async def send(progress: int, total: int, message: str):
+        # ツールの結果を返した後に届いた通知は送らない
+        if listener not in job.listeners:
+            return
+        await session.send_progress_notification(progress_token, progress, total=total, message=message)
+
+    def listener(progress: int, total: int, message: str):
+        asyncio.run_coroutine_threadsafe(send(progress, total, message), loop)
+
+    return listener
+
+
+def _on_crawl_done(key: tuple[str, int], task: asyncio.Task):
+    """クロール完了時に実行中リストから外し、エラーを記録"""
+    hatena_crawl_jobs.pop(key, None)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"はてなブログのクロール中にエラーが発生しました: {task.exception()}")
+
+
+async def fetch_hatena_article(
+    blog_url: str,
+    start_year: int = 2014,
+    use_cache: bool = True,
+    wait_for_full: bool = False,
+    provisional_timeout: float = 5.0,
+    cooldown_days: Optional[int] = None,
+    parse_workers: int = 0,
+    fetch_workers: int = 2,
+) -> dict:
+    """
+    はてなブログの記事を1件選出する
+
+    キャッシュがない場合はクロールをバックグラウンドで開始し、進捗を
+    progress notificationで送信する。wait_for_fullがFalseの場合、
+    provisional_timeout秒以内にクロールが終わらなければ収集済みの記事から
+    暫定の記事を選出して返す（クロールは継続し、完了後にキャッシュされる）。
+    parse_workersを指定するとアーカイブページをfetch_workersスレッドで取得し、
+    解析をプロセスプールで行う。
+    """
+    key = (blog_url, start_year)
+    job = hatena_crawl_jobs.get(key)
+
+    if job is None:
+        crawler = HatenaArchiveCrawler(blog_url=blog_url, history=posted_history)
+        cached_articles = crawler.load_cache() if use_cache else None
+        if cached_articles:
+            return crawler.weighted_random_selection(cached_articles, cooldown_days=cooldown_days)
+
+        job = HatenaCrawlJob(crawler)
+        job.task = asyncio.create_task(
+            asyncio.to_thread(
+                crawler.refresh_articles, start_year=start_year, parse_workers=parse_workers, fetch_workers=fetch_workers
+            )
+        )
+        job.task.add_done_callback(lambda task: _on_crawl_done(key, task))
+        hatena_crawl_jobs[key] = job
+
+    ctx = server.request_context
+    progress_token = ctx.meta.progressToken if ctx.meta else None
+    listener = _progress_listener(job, progress_token, asyncio.get_running_loop()) if progress_token is not None else None
+    if listener:
+        job.listeners.append(listener)
+
+    try:
+        if not wait_for_full:
+            await asyncio.wait({job.task}, timeout=provisional_timeout)
+            while not job.task.done():
+                partial_articles = list(job.crawler.collected_articles)
+                if partial_articles:
+                    selected_article = dict(
+                        job.crawler.weighted_random_selection(partial_articles, cooldown_days=cooldown_days)
+                    )
+                    selected_article["provisional"] = True
+                    return selected_article
+                await asyncio.wait({job.task}, timeout=0.5)
+
+        articles = await asyncio.shield(job.task)
+        return job.crawler.weighted_random_selection(articles, cooldown_days=cooldown_days)
+    finally:
+        if listener:
+            job.listeners.remove(listener)
+
 
 @server.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
@@ -49,6 +172,11 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "integer",
                         "description": "ランダムシード（再現性のため）",
                     },
+                    "cooldown_days": {
+                        "type": "integer",
+                        "description": "一度選出した記事を再び選出しない日数（0で無効）",
+                        "default": 30,
+                    },
                 },
                 "required": ["username"],
             },
@@ -73,6 +201,31 @@ async def handle_list_tools() -> list[types.Tool]:
                         "description": "キャッシュを使用するか",
                         "default": True,
                     },
+                    "wait_for_full": {
+                        "type": "boolean",
+                        "description": "クロール完了まで待つか（falseの場合は収集途中の記事から暫定選出することがある）",
+                        "default": False,
+                    },
+                    "provisional_timeout": {
+                        "type": "number",
+                        "description": "暫定選出を返すまでにクロール完了を待つ秒数",
+                        "default": 5,
+                    },
+                    "parse_workers": {
+                        "type": "integer",
+                        "description": "アーカイブページの解析に使うプロセス数（0の場合は逐次処理）",
+                        "default": 0,
+                    },
+                    "fetch_workers": {
+                        "type": "integer",
+                        "description": "parse_workers指定時にアーカイブページの取得に使うスレッド数",
+                        "default": 2,
+                    },
+                    "cooldown_days": {
+                        "type": "integer",
+                        "description": "一度選出した記事を再び選出しない日数（0で無効）",
+                        "default": 30,
+                    },
                 },
                 "required": ["blog_url"],
             },
@@ -96,10 +249,48 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "integer",
                         "description": "ランダムシード（再現性のため）",
                     },
+                    "cooldown_days": {
+                        "type": "integer",
+                        "description": "一度選出した記事を再び選出しない日数（0で無効）",
+                        "default": 30,
+                    },
                 },
                 "required": ["username"],
             },
         ),
+        types.Tool(
+            name="fetch_batch_articles",
+            description="複数アカウント（Zenn、Qiita、はてなブログ）の記事をまとめて取得します。",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "accounts": {
+                        "type": "array",
+                        "description": "アカウント設定のリスト（platformと各ツールの引数）",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "platform": {
+                                    "type": "string",
+                                    "enum": ["zenn", "qiita", "hatena"],
+                                },
+                            },
+                            "required": ["platform"],
+                        },
+                    },
+                    "max_workers": {
+                        "type": "integer",
+                        "description": "共有ワーカープールのスレッド数",
+                        "default": 32,
+                    },
+                    "output_file": {
+                        "type": "string",
+                        "description": "結果をJSON Lines形式で逐次書き出すファイル（省略可）",
+                    },
+                },
+                "required": ["accounts"],
+            },
+        ),
     ]
 
 
@@ -119,10 +310,11 @@ async def handle_call_tool(
         is_company = arguments.get("is_company", False)
         limit = arguments.get("limit", 1)
         random_seed = arguments.get("random_seed")
+        cooldown_days = arguments.get("cooldown_days")
 
         try:
-            fetcher = ZennDataFetcher(username, is_company=is_company)
-            articles = fetcher.get_popular_articles(limit=limit, random_seed=random_seed)
+            fetcher = ZennDataFetcher(username, is_company=is_company, history=posted_history)
+            articles = fetcher.get_popular_articles(limit=limit, random_seed=random_seed, cooldown_days=cooldown_days)
 
             return [
                 types.TextContent(
@@ -141,10 +333,23 @@ async def handle_call_tool(
 
         start_year = arguments.get("start_year", 2014)
         use_cache = arguments.get("use_cache", True)
+        wait_for_full = arguments.get("wait_for_full", False)
+        provisional_timeout = arguments.get("provisional_timeout", 5)
+        cooldown_days = arguments.get("cooldown_days")
+        parse_workers = arguments.get("parse_workers", 0)
+        fetch_workers = arguments.get("fetch_workers", 2)
 
         try:
-            crawler = HatenaArchiveCrawler(blog_url=blog_url)
-            selected_article, _ = crawler.run_full_crawl(start_year=start_year, use_cache=use_cache)
+            selected_article = await fetch_hatena_article(
+                blog_url,
+                start_year=start_year,
+                use_cache=use_cache,
+                wait_for_full=wait_for_full,
+                provisional_timeout=provisional_timeout,
+                cooldown_days=cooldown_days,
+                parse_workers=parse_workers,
+                fetch_workers=fetch_workers,
+            )
 
             return [
                 types.TextContent(
@@ -163,10 +368,11 @@ async def handle_call_tool(
 
         limit = arguments.get("limit", 1)
         random_seed = arguments.get("random_seed")
+        cooldown_days = arguments.get("cooldown_days")
 
         try:
-            fetcher = QiitaDataFetcher(username)
-            articles = fetcher.get_popular_articles(limit=limit, random_seed=random_seed)
+            fetcher = QiitaDataFetcher(username, history=posted_history)
+            articles = fetcher.get_popular_articles(limit=limit, random_seed=random_seed, cooldown_days=cooldown_days)
 
             return [
                 types.TextContent(
@@ -178,6 +384,32 @@ async def handle_call_tool(
             logger.error(f"Qiita記事の取得中にエラーが発生しました: {e}")
             raise
 
+    elif name == "fetch_batch_articles":
+        accounts = arguments.get("accounts")
+        if not accounts:
+            raise ValueError("accounts is required")
+
+        max_workers = arguments.get("max_workers", 32)
+        output_file = arguments.get("output_file")
+
+        try:
+            # バッチ全体の実行中もイベントループを止めないよう別スレッドで実行する
+            if output_file:
+                with open(output_file, "a", encoding="utf-8") as f:
+                    results = await asyncio.to_thread(BatchRunner(max_workers=max_workers, output=f).run, accounts)
+            else:
+                results = await asyncio.to_thread(BatchRunner(max_workers=max_workers).run, accounts)
+
+            return [
+                types.TextContent(
+                    type="text",
+                    text=json.dumps(results, ensure_ascii=False, indent=2),
+                )
+            ]
+        except Exception as e:
+            logger.error(f"バッチ取得中にエラーが発生しました: {e}")
+            raise
+
     else:
         raise ValueError(f"Unknown tool: {name}")
 
@@ -199,10 +431,72 @@ async def main():
         )
 
 
+def run_batch(args):
+    """batchサブコマンドを実行し、結果をJSON Lines形式で書き出す"""
+    accounts = load_accounts(args.accounts)
+    host_limits = parse_host_limits(args.host_limit)
+
+    if args.output == "-":
+        BatchRunner(max_workers=args.max_workers, host_limits=host_limits, output=sys.stdout).run(accounts)
+    else:
+        with open(args.output, "a", encoding="utf-8") as f:
+            BatchRunner(max_workers=args.max_workers, host_limits=host_limits, output=f).run(accounts)
+
+
+def run_cache(args):
+    """cacheサブコマンドを実行し、結果をJSONで出力する"""
+    store = CacheStore()
+
+    if args.action == "stats":
+        result = store.stats()
+    elif args.action == "compact":
+        result = store.compact()
+    elif args.action == "evict":
+        result = {"evicted": store.evict(max_bytes=args.max_bytes)}
+    else:
+        store.clear()
+        result = {"cleared": str(store.root)}
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
 def run():
     """同期的なエントリーポイント（CLIから呼ばれる）"""
+    import argparse
     import asyncio
 
+    parser = argparse.ArgumentParser(prog="sns-post-plugin", description="SNS Post Plugin MCP Server")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch_parser = subparsers.add_parser("batch", help="複数アカウントの記事をまとめて取得")
+    batch_parser.add_argument("accounts", help="アカウント一覧のJSONファイル（- で標準入力）")
+    batch_parser.add_argument("-o", "--output", default="-", help="結果の出力先（JSON Lines、デフォルト: 標準出力）")
+    batch_parser.add_argument("--max-workers", type=int, default=32, help="共有ワーカープールのスレッド数")
+    batch_parser.add_argument(
+        "--host-limit",
+        action="append",
+        default=[],
+        metavar="HOST=N",
+        help="ホストごとの同時リクエスト数の上限（複数指定可）",
+    )
+
+    cache_parser = subparsers.add_parser("cache", help="記事キャッシュの管理")
+    cache_parser.add_argument(
+        "action",
+        choices=["stats", "compact", "evict", "clear"],
+        help="stats: 使用状況 / compact: 不要なレコードの削除 / evict: 古いソースの削除 / clear: 全削除",
+    )
+    cache_parser.add_argument("--max-bytes", type=int, default=None, help="evictの上限サイズ（バイト）")
+
+    args = parser.parse_args()
+
+    if args.command == "batch":
+        run_batch(args)
+        return
+    if args.command == "cache":
+        run_cache(args)
+        return
+
     asyncio.run(main())
 
 
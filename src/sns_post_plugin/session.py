@@ -0,0 +1,31 @@
+"""フェッチャーが共有するHTTPセッションの作成モジュール"""
+
+from typing import Optional
+
+import requests
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+)
+
+
+def default_session(session: Optional[requests.Session] = None, user_agent: str = DEFAULT_USER_AGENT) -> requests.Session:
+    """
+    指定されたセッション、またはUser-Agentを設定した新しいセッションを返す
+
+    指定されたセッションは複数のフェッチャーで共有されるため、ヘッダーは
+    作成した呼び出し元の設定をそのまま使い、ここでは上書きしない。
+
+    Args:
+        session: 共有するHTTPセッション（省略時は新規作成）
+        user_agent: 新規作成するセッションのUser-Agent
+
+    Returns:
+        requests.Session: フェッチャーが使用するセッション
+    """
+    if session is not None:
+        return session
+
+    session = requests.Session()
+    session.headers.update({"User-Agent": user_agent})
+    return session
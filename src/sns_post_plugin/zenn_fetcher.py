@@ -4,8 +4,10 @@ from typing import List, Dict, Any, Optional
 import logging
 import requests
 import re
-from datetime import datetime
-import random
+
+from .scoring import likes_rank_engine
+from .session import default_session
+from .history import PostedHistory
 
 logger = logging.getLogger(__name__)
 
@@ -13,25 +15,31 @@ logger = logging.getLogger(__name__)
 class ZennDataFetcher:
     """Zennのアカウントから記事情報を取得するクラス"""
 
-    def __init__(self, username: str, is_company: bool = False):
+    def __init__(
+        self,
+        username: str,
+        is_company: bool = False,
+        session: Optional[requests.Session] = None,
+        history: Optional[PostedHistory] = None,
+    ):
         """
         ZennDataFetcherの初期化
 
         Args:
             username: Zennのユーザー名
             is_company: 企業アカウントかどうか
+            session: 共有するHTTPセッション（省略時は新規作成）
+            history: 選出済み記事の履歴（指定時はクールダウン中の記事を避ける）
         """
         self.username = username
         self.is_company = is_company
         self.base_url = "https://zenn.dev"
         self.setup_urls()
 
-        self.session = requests.Session()
-        self.session.headers.update(
-            {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-        )
+        self.scoring_engine = likes_rank_engine()
+        self.history = history
+
+        self.session = default_session(session)
 
     def setup_urls(self):
         """URLを設定する"""
@@ -161,36 +169,36 @@ class ZennDataFetcher:
         articles = self.fetch_articles_via_api(max_articles)
         return articles
 
-    def get_popular_articles(self, limit: int = 5, random_seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    def get_popular_articles(
+        self, limit: int = 5, random_seed: Optional[int] = None, cooldown_days: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
         """
         人気記事を取得する
 
         Args:
             limit: 取得する記事数（デフォルト: 5）
-            random_seed: ランダムシードの値（Noneの場合は現在時刻を使用）
+            random_seed: ランダムシードの値（Noneの場合は毎回異なる結果）
+            cooldown_days: 選出済みの記事を再び選出しない日数（省略時は履歴のデフォルト値）
 
         Returns:
             List[Dict[str, Any]]: 人気記事のリスト
         """
-        if random_seed is None:
-            random_seed = int(datetime.now().timestamp())
-        random.seed(random_seed)
-
         articles = self.fetch_articles()
 
         if not articles:
             logger.warning("記事が見つかりませんでした")
             return []
 
-        sorted_articles = sorted(articles, key=lambda x: x.get("likes", 0), reverse=True)
-        max_articles = min(100, len(sorted_articles))
-        top_articles = sorted_articles[:max_articles]
-
-        if len(top_articles) <= limit:
-            return top_articles
+        if len(articles) <= limit:
+            selected_articles = sorted(articles, key=lambda x: x.get("likes", 0), reverse=True)
+            if self.history:
+                self.history.record(selected_articles)
+            return selected_articles
 
-        weights = [1.0 / (i + 1) for i in range(len(top_articles))]
-        selected_articles = random.choices(population=top_articles, weights=weights, k=limit)
+        exclude = self.history.cooldown_mask(articles, cooldown_days) if self.history else None
+        selected_articles = self.scoring_engine.select(articles, k=limit, random_seed=random_seed, exclude=exclude)
+        if self.history:
+            self.history.record(selected_articles)
 
         for article in selected_articles:
             if not article.get("tags"):